@@ -4,13 +4,114 @@ import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import json
 import os
+import hashlib
+
+# delta sync helpers, kept in step with Server/server.py
+CHECKSUM_MOD = 1 << 16
+DELTA_MIN_SIZE = 8 * 1024  # smaller files always go in full
+DELTA_MAX_RATIO = 0.5  # send in full if more than this is new data
+
+def weak_checksum(block):
+    # rsync style rolling checksum parts
+    a = b = 0
+    size = len(block)
+    for i, char in enumerate(block):
+        a += ord(char)
+        b += (size - i) * ord(char)
+    return a % CHECKSUM_MOD, b % CHECKSUM_MOD
+
+def strong_checksum(block):
+    return hashlib.md5(block.encode()).hexdigest()[:16]
+
+def compute_delta(content, block_size, signatures, max_literal=None):
+    # returns ops of literal strings and [first block, block count] copies,
+    # applied by apply_delta in Server/server.py, or None as soon as more
+    # than max_literal characters are unmatched
+    blocks = {}
+    for index, (weak, strong) in enumerate(signatures):
+        blocks.setdefault(weak, []).append((index, strong))
+    
+    ops = []
+    literal_start = 0
+    literal_size = 0  # unmatched characters already in ops
+    pos = 0
+    length = len(content)
+    if length >= block_size and blocks:
+        a, b = weak_checksum(content[:block_size])
+    
+    while blocks and pos + block_size <= length:
+        match = None
+        candidates = blocks.get(a + (b << 16))
+        if candidates:
+            strong = strong_checksum(content[pos:pos + block_size])
+            for index, block_strong in candidates:
+                if block_strong == strong:
+                    match = index
+                    break
+        
+        if match is None:
+            # slide the window one character
+            if pos + block_size < length:
+                old = ord(content[pos])
+                new = ord(content[pos + block_size])
+                a = (a - old + new) % CHECKSUM_MOD
+                b = (b - block_size * old + a) % CHECKSUM_MOD
+            pos += 1
+            if max_literal is not None and literal_size + pos - literal_start > max_literal:
+                return None
+            continue
+        
+        if literal_start < pos:
+            ops.append(content[literal_start:pos])
+            literal_size += pos - literal_start
+        if ops and not isinstance(ops[-1], str) and sum(ops[-1]) == match:
+            ops[-1][1] += 1  # extends the previous copy
+        else:
+            ops.append([match, 1])
+        pos += block_size
+        literal_start = pos
+        if pos + block_size <= length:
+            a, b = weak_checksum(content[pos:pos + block_size])
+    
+    if max_literal is not None and literal_size + length - literal_start > max_literal:
+        return None
+    if literal_start < length:
+        ops.append(content[literal_start:])
+    return ops
+
+class MessageBuffer:
+    # splits newline delimited json messages out of a byte stream,
+    # kept in step with Server/server.py
+    def __init__(self):
+        self.data = bytearray()
+        self.scanned = 0  # bytes already searched for a newline
+    
+    def feed(self, chunk):
+        self.data += chunk
+        messages = []
+        while True:
+            end = self.data.find(b"\n", self.scanned)
+            if end == -1:
+                self.scanned = len(self.data)
+                return messages
+            line = bytes(self.data[:end])
+            del self.data[:end + 1]
+            self.scanned = 0
+            if line.strip():
+                messages.append(json.loads(line.decode()))
 
 class FileClient:
     def __init__(self):
         # basic setup
         self.socket = None
         self.connected = False
+        self.send_lock = threading.Lock()
         self.username = ""  # store current username
+        self.server_files = {}  # last file list from server
+        self.pending_uploads = {}  # filename -> content waiting on delta sync
+        self.downloads = {}  # filename -> chunks received so far
+        self.search_query = ""
+        self.search_page = 1
         
         # setup window
         self.window = tk.Tk()
@@ -68,6 +169,26 @@ class FileClient:
         ttk.Button(download_frame, text="Set Download Folder", 
                   command=self.select_download_folder).pack(side=tk.LEFT, padx=5)
         
+        # download notifications
+        notify_frame = ttk.Frame(file_frame)
+        notify_frame.pack(fill=tk.X, padx=5, pady=2)
+        self.notify_downloads = tk.BooleanVar(value=True)
+        ttk.Checkbutton(notify_frame, text="Notify me when my files are downloaded",
+                       variable=self.notify_downloads,
+                       command=self.update_subscription).pack(side=tk.LEFT, padx=5)
+        
+        # search area
+        search_frame = ttk.LabelFrame(self.window, text="Search File Contents")
+        search_frame.pack(padx=5, pady=5, fill=tk.X)
+        self.search_entry = ttk.Entry(search_frame)
+        self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        ttk.Button(search_frame, text="Search", 
+                  command=self.search_files).pack(side=tk.LEFT, padx=2)
+        ttk.Button(search_frame, text="Prev", 
+                  command=lambda: self.change_search_page(-1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(search_frame, text="Next", 
+                  command=lambda: self.change_search_page(1)).pack(side=tk.LEFT, padx=2)
+        
         # file list area
         list_frame = ttk.LabelFrame(self.window, text="Available Files")
         list_frame.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
@@ -138,6 +259,9 @@ class FileClient:
                 pass
         self.connected = False
         self.username = ""  # clear username
+        self.server_files = {}
+        self.pending_uploads.clear()
+        self.downloads.clear()
         self.connect_btn.config(text="Connect")
         self.log("disconnected from server")
         
@@ -168,9 +292,49 @@ class FileClient:
             
         self.send_message({"type": "list_files"})
     
+    def search_files(self):
+        query = self.search_entry.get().strip()
+        if not query:
+            messagebox.showerror("Error", "enter something to search for!")
+            return
+        
+        self.search_query = query
+        self.search_page = 1
+        self.request_search()
+    
+    def change_search_page(self, step):
+        if not self.search_query or self.search_page + step < 1:
+            return
+        self.search_page += step
+        self.request_search()
+    
+    def request_search(self):
+        if not self.connected:
+            messagebox.showerror("Error", "connect to server first!")
+            return
+        
+        self.send_message({
+            "type": "search",
+            "query": self.search_query,
+            "page": self.search_page,
+            "page_size": 10
+        })
+    
+    def update_subscription(self):
+        if not self.connected:
+            return
+        
+        # server groups downloads per file within the window
+        if self.notify_downloads.get():
+            self.send_message({"type": "subscribe", "topic": "downloads", "window": 5})
+        else:
+            self.send_message({"type": "unsubscribe", "topic": "downloads"})
+    
     def send_message(self, message):
         try:
-            self.socket.send(json.dumps(message).encode())
+            # one message per line, gui and receive threads both send
+            with self.send_lock:
+                self.socket.sendall(json.dumps(message).encode() + b"\n")
         except Exception as e:
             self.log(f"couldn't send message: {str(e)}")
             self.disconnect()
@@ -189,12 +353,13 @@ class FileClient:
     
     def receive_messages(self):
         try:
+            buffer = MessageBuffer()
             while self.connected:
-                data = self.socket.recv(1024).decode()
+                data = self.socket.recv(64 * 1024)
                 if not data:
                     break
-                message = json.loads(data)
-                self.handle_server_message(message)
+                for message in buffer.feed(data):
+                    self.handle_server_message(message)
         except Exception as e:
             if self.connected:  # only log if we didn't disconnect on purpose
                 self.log(f"lost connection: {str(e)}")
@@ -208,6 +373,7 @@ class FileClient:
                     self.username_entry.delete(0, tk.END)
                     self.username_entry.insert(0, self.username)
                     self.log(f"connected as '{self.username}'")
+                    self.update_subscription()
                     self.request_file_list()  # get initial file list
                 else:
                     error_msg = message.get('message', 'connection failed')
@@ -216,20 +382,33 @@ class FileClient:
                     self.disconnect()
             elif message['type'] == 'file_list':
                 self.update_file_list(message['files'])
+            elif message['type'] == 'delta_signature':
+                # scanning a big file shouldn't hold up other messages
+                threading.Thread(target=self.send_delta_upload, args=(message,), daemon=True).start()
             elif message['type'] == 'upload_response':
+                content = self.pending_uploads.pop(message.get('filename'), None)
                 if message['status'] == 'success':
-                    if message.get('overwritten', False):
+                    if message.get('delta', False):
+                        self.log(f"overwrote file with delta: {message['filename']}")
+                    elif message.get('overwritten', False):
                         self.log(f"overwrote file: {message['filename']}")
                     else:
                         self.log(f"uploaded file: {message['filename']}")
                     self.request_file_list()  # refresh list
+                elif message.get('resend') and content is not None:
+                    self.log(f"delta upload failed ({message.get('message', 'unknown error')}), sending full file")
+                    self.send_full_upload(message['filename'], content)
                 else:
                     self.log(f"upload failed: {message.get('message', 'unknown error')}")
+            elif message['type'] == 'download_start':
+                self.downloads[message['filename']] = {"size": message['size'], "parts": [], "received": 0}
+            elif message['type'] == 'download_chunk':
+                self.receive_download_chunk(message)
+            elif message['type'] == 'download_end':
+                self.finish_download(message['filename'])
             elif message['type'] == 'download_response':
-                if message['status'] == 'success':
-                    self.save_downloaded_file(message['filename'], message['content'])
-                else:
-                    self.log(f"download failed: {message.get('message', 'unknown error')}")
+                # only sent when the download couldn't start
+                self.log(f"download failed: {message.get('message', 'unknown error')}")
             elif message['type'] == 'delete_response':
                 if message['status'] == 'success':
                     self.log(f"deleted file: {message['filename']}")
@@ -237,11 +416,48 @@ class FileClient:
                 else:
                     self.log(f"couldn't delete: {message.get('message', 'unknown error')}")
             elif message['type'] == 'download_notification':
-                self.log(f"{message['downloader']} downloaded your file: {message['filename']}")
+                self.log_download_notification(message)
+            elif message['type'] == 'notification_batch':
+                self.log(f"while you were away ({len(message['notifications'])} notifications):")
+                for notification in message['notifications']:
+                    self.log_download_notification(notification)
+                if message.get('dropped'):
+                    self.log(f"...and {message['dropped']} older notifications")
+            elif message['type'] == 'search_response':
+                if message['status'] == 'success':
+                    self.show_search_results(message)
+                else:
+                    self.log(f"search failed: {message.get('message', 'unknown error')}")
+            elif message['type'] == 'subscribe_response':
+                if message['status'] == 'success':
+                    state = "on" if message['subscribed'] else "off"
+                    self.log(f"download notifications {state}")
+                else:
+                    self.log(f"couldn't change notifications: {message.get('message', 'unknown error')}")
         except Exception as e:
             self.log(f"error handling message: {str(e)}")
     
+    def show_search_results(self, message):
+        pages = max(1, -(-message['total'] // message['page_size']))
+        self.log(f"search '{message['query']}': {message['total']} files, "
+                 f"page {message['page']} of {pages}")
+        for result in message['results']:
+            owner = result['owner'] or ""
+            display_filename = result['filename'][len(owner) + 1:] if owner else result['filename']
+            self.log(f"  {display_filename} ({owner}): {result['snippet']}")
+    
+    def log_download_notification(self, message):
+        count = message.get('count', 1)
+        if count == 1:
+            self.log(f"{message['downloader']} downloaded your file: {message['filename']}")
+        else:
+            users = len(message.get('downloaders', []))
+            self.log(f"{count} downloads of your file {message['filename']} "
+                     f"by {users} users in the last {message['window']:g}s")
+    
     def update_file_list(self, files):
+        self.server_files = files
+        
         # clear current list
         for item in self.file_list.get_children():
             self.file_list.delete(item)
@@ -266,14 +482,23 @@ class FileClient:
             # get filename
             filename = os.path.basename(file_path)
             
-            # send to server
-            self.send_message({
-                "type": "upload_file",
-                "filename": filename,
-                "content": content
-            })
+            if filename in self.pending_uploads:
+                messagebox.showerror("Error", "this file is already being uploaded!")
+                return
+            
+            # overwriting a big file, only send what changed
+            full_filename = f"{self.username}_{filename}"
+            if (self.server_files.get(full_filename) == self.username
+                    and len(content) >= DELTA_MIN_SIZE):
+                self.pending_uploads[filename] = content
+                self.send_message({
+                    "type": "delta_signature_request",
+                    "filename": filename
+                })
+                self.log(f"uploading changes: {filename}")
+                return
             
-            self.log(f"uploading: {filename}")
+            self.send_full_upload(filename, content)
             
         except UnicodeDecodeError:
             messagebox.showerror("Error", "file must be text only!")
@@ -282,6 +507,67 @@ class FileClient:
             messagebox.showerror("Error", f"upload failed: {str(e)}")
             self.log(f"upload error: {str(e)}")
     
+    def send_full_upload(self, filename, content):
+        self.send_message({
+            "type": "upload_file",
+            "filename": filename,
+            "content": content
+        })
+        self.log(f"uploading: {filename}")
+    
+    def send_delta_upload(self, message):
+        filename = message.get('filename')
+        content = self.pending_uploads.get(filename)
+        if content is None:
+            return
+        
+        if message['status'] != 'success':
+            self.pending_uploads.pop(filename)
+            self.log(f"delta sync unavailable ({message.get('message', 'unknown error')}), sending full file")
+            self.send_full_upload(filename, content)
+            return
+        
+        ops = compute_delta(content, message['block_size'], message['signatures'],
+                            int(len(content) * DELTA_MAX_RATIO))
+        if ops is None:
+            self.pending_uploads.pop(filename)
+            self.log(f"too many changes for delta, sending full file: {filename}")
+            self.send_full_upload(filename, content)
+            return
+        
+        # content stays pending in case the server asks for a resend
+        self.send_message({
+            "type": "upload_delta",
+            "filename": filename,
+            "block_size": message['block_size'],
+            "base_checksum": message['checksum'],
+            "checksum": hashlib.md5(content.encode()).hexdigest(),
+            "ops": ops
+        })
+        literal_size = sum(len(op) for op in ops if isinstance(op, str))
+        self.log(f"sending {literal_size} of {len(content)} chars: {filename}")
+    
+    def receive_download_chunk(self, message):
+        download = self.downloads.get(message['filename'])
+        if download is None:
+            return
+        if message['offset'] != download['received']:
+            # chunks arrive in order, anything else means data was lost
+            del self.downloads[message['filename']]
+            self.log(f"download failed: missing data in {message['filename']}")
+            return
+        download['parts'].append(message['data'])
+        download['received'] += len(message['data'])
+    
+    def finish_download(self, filename):
+        download = self.downloads.pop(filename, None)
+        if download is None:
+            return
+        if download['received'] != download['size']:
+            self.log(f"download failed: {filename} is incomplete")
+            return
+        self.save_downloaded_file(filename, "".join(download['parts']))
+    
     def save_downloaded_file(self, filename, content):
         try:
             if not self.download_folder:
@@ -4,11 +4,769 @@ import tkinter as tk
 from tkinter import filedialog, ttk
 import json
 import os
+import hashlib
+import math
+import queue
+import re
+import selectors
+import time
+from collections import deque
+
+# delta sync helpers, kept in step with Client/client.py
+CHECKSUM_MOD = 1 << 16
+
+def weak_checksum(block):
+    # rsync style rolling checksum parts
+    a = b = 0
+    size = len(block)
+    for i, char in enumerate(block):
+        a += ord(char)
+        b += (size - i) * ord(char)
+    return a % CHECKSUM_MOD, b % CHECKSUM_MOD
+
+def strong_checksum(block):
+    return hashlib.md5(block.encode()).hexdigest()[:16]
+
+def delta_block_size(length):
+    # roughly sqrt of the file size like rsync
+    return min(max(700, int(length ** 0.5)), 64 * 1024)
+
+def block_signatures(content, block_size):
+    # only full blocks, the tail is always sent as literal data
+    signatures = []
+    for start in range(0, len(content) - block_size + 1, block_size):
+        block = content[start:start + block_size]
+        a, b = weak_checksum(block)
+        signatures.append([a + (b << 16), strong_checksum(block)])
+    return signatures
+
+def apply_delta(base, block_size, ops):
+    # ops are literal strings or [first block, block count] copies,
+    # as produced by compute_delta in Client/client.py
+    block_count = len(base) // block_size
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            first, count = op
+            if first < 0 or count < 1 or first + count > block_count:
+                raise Exception("Delta references a block outside the file")
+            parts.append(base[first * block_size:(first + count) * block_size])
+    return "".join(parts)
+
+class MessageBuffer:
+    # splits newline delimited json messages out of a byte stream,
+    # kept in step with Client/client.py
+    def __init__(self):
+        self.data = bytearray()
+        self.scanned = 0  # bytes already searched for a newline
+    
+    def feed(self, chunk):
+        self.data += chunk
+        messages = []
+        while True:
+            end = self.data.find(b"\n", self.scanned)
+            if end == -1:
+                self.scanned = len(self.data)
+                return messages
+            line = bytes(self.data[:end])
+            del self.data[:end + 1]
+            self.scanned = 0
+            if line.strip():
+                messages.append(json.loads(line.decode()))
+
+def encode_message(message):
+    # json.dumps escapes newlines, so one line is one message
+    return json.dumps(message).encode() + b"\n"
+
+class TokenBucket:
+    def __init__(self, rate):
+        # rate in bytes per second, 0 means unlimited
+        self.rate = 0
+        self.burst = 0
+        self.tokens = 0
+        self.last = time.monotonic()
+        self.set_rate(rate)
+        self.tokens = self.burst  # start with a full burst
+    
+    def set_rate(self, rate):
+        self.rate = max(0, rate)
+        # allow up to one second of data in a burst
+        self.burst = max(self.rate, 64 * 1024)
+        self.tokens = min(self.tokens, self.burst) if self.rate else self.burst
+    
+    def refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+    
+    def delay(self, now):
+        # seconds until sending is allowed again
+        self.refill(now)
+        if not self.rate or self.tokens > 0:
+            return 0
+        return -self.tokens / self.rate
+    
+    def consume(self, amount):
+        # tokens can go negative, the next send just waits longer
+        if self.rate:
+            self.tokens -= amount
+
+class TransferScheduler:
+    CONTROL = "control"
+    BULK = "bulk"
+    CHUNK_SIZE = 4096
+    POLL_INTERVAL = 0.01
+    
+    def __init__(self, log):
+        self.log = log
+        self.cond = threading.Condition()
+        self.clients = {}  # per client queues
+        # selectors has no 1024 descriptor limit like select.select
+        self.selector = selectors.DefaultSelector()
+        self.global_bucket = TokenBucket(0)
+        self.default_client_rate = 0
+        self.running = False
+        self.generation = 0  # bumped on start so an old send loop exits
+        
+        # queueing delay samples per priority
+        self.delays = {self.CONTROL: deque(maxlen=1000), self.BULK: deque(maxlen=1000)}
+        self.sent_bytes = {self.CONTROL: 0, self.BULK: 0}
+    
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self.send_loop, args=(generation,), daemon=True).start()
+    
+    def stop(self):
+        with self.cond:
+            self.running = False
+            for state in self.clients.values():
+                self.unregister(state['socket'])
+            self.clients.clear()
+            self.cond.notify_all()
+    
+    def add_client(self, username, client_socket):
+        with self.cond:
+            self.clients[username] = {
+                "socket": client_socket,
+                "control": deque(),
+                "bulk": deque(),
+                "current": None,  # message being written to the socket
+                "bucket": TokenBucket(self.default_client_rate),
+                "custom_rate": False,
+                "weight": 1.0,
+                "vtime": 0.0,  # bulk bytes sent divided by weight
+                "retry_at": 0  # when to try again after a full buffer
+            }
+            self.selector.register(client_socket, selectors.EVENT_WRITE, username)
+    
+    def remove_client(self, username):
+        with self.cond:
+            state = self.clients.pop(username, None)
+            if state is not None:
+                self.unregister(state['socket'])
+    
+    def unregister(self, client_socket):
+        try:
+            self.selector.unregister(client_socket)
+        except (KeyError, ValueError, OSError):
+            pass
+    
+    def enqueue(self, username, message, priority=CONTROL):
+        data = encode_message(message)
+        with self.cond:
+            state = self.clients.get(username)
+            if state is None:
+                return False
+            
+            if priority == self.BULK and not (state['bulk'] or self.is_bulk(state['current'])):
+                # a client becoming busy starts at the current fair share
+                active = [s['vtime'] for s in self.clients.values() if self.has_bulk(s)]
+                if active:
+                    state['vtime'] = max(state['vtime'], min(active))
+            
+            state[priority].append({
+                "data": data,
+                "offset": 0,
+                "priority": priority,
+                "queued": time.monotonic()
+            })
+            self.cond.notify()
+        return True
+    
+    # runtime limits, rates in bytes per second with 0 meaning unlimited
+    def set_global_rate(self, rate):
+        with self.cond:
+            self.global_bucket.set_rate(rate)
+            self.cond.notify()
+    
+    def set_default_client_rate(self, rate):
+        with self.cond:
+            self.default_client_rate = rate
+            for state in self.clients.values():
+                if not state['custom_rate']:
+                    state['bucket'].set_rate(rate)
+            self.cond.notify()
+    
+    def set_client_rate(self, username, rate):
+        with self.cond:
+            if username in self.clients:
+                state = self.clients[username]
+                # None goes back to the default rate
+                state['custom_rate'] = rate is not None
+                state['bucket'].set_rate(self.default_client_rate if rate is None else rate)
+                self.cond.notify()
+    
+    def set_client_weight(self, username, weight):
+        with self.cond:
+            if username in self.clients and math.isfinite(weight) and weight > 0:
+                self.clients[username]['weight'] = weight
+    
+    def is_bulk(self, item):
+        return item is not None and item['priority'] == self.BULK
+    
+    def has_bulk(self, state):
+        return bool(state['bulk']) or self.is_bulk(state['current'])
+    
+    def writable_sockets(self, now):
+        if not any(s['current'] or s['control'] or s['bulk'] for s in self.clients.values()):
+            return set()
+        try:
+            ready = self.selector.select(0)
+        except (OSError, ValueError):
+            # nothing is treated as writable, pick_next polls again shortly
+            return set()
+        # sockets that just reported a full buffer wait out the poll interval
+        return set(key.fileobj for key, _ in ready
+                   if key.data in self.clients and self.clients[key.data]['retry_at'] <= now)
+    
+    def pick_next(self):
+        # returns (username, None) to send or (None, seconds to wait)
+        now = time.monotonic()
+        writable = self.writable_sockets(now)
+        blocked = False
+        
+        # control messages go before any bulk data, oldest first
+        best = None
+        oldest = None
+        for username, state in self.clients.items():
+            current = state['current']
+            if self.is_bulk(current) or not (current or state['control']):
+                continue
+            if state['socket'] not in writable:
+                blocked = True
+                continue
+            queued = (current or state['control'][0])['queued']
+            if oldest is None or queued < oldest:
+                best = username
+                oldest = queued
+        
+        if best is not None:
+            state = self.clients[best]
+            if state['current'] is None:
+                state['current'] = self.start_item(state['control'].popleft(), now)
+            return best, None
+        
+        # bulk data shared between clients by weight
+        best = None
+        wait = None
+        global_wait = self.global_bucket.delay(now)
+        for username, state in self.clients.items():
+            if not self.has_bulk(state) or (state['current'] and not self.is_bulk(state['current'])):
+                continue
+            client_wait = max(global_wait, state['bucket'].delay(now))
+            if client_wait > 0:
+                wait = client_wait if wait is None else min(wait, client_wait)
+                continue
+            if state['socket'] not in writable:
+                blocked = True
+                continue
+            if best is None or state['vtime'] < self.clients[best]['vtime']:
+                best = username
+        
+        if best is not None:
+            state = self.clients[best]
+            if state['current'] is None:
+                state['current'] = self.start_item(state['bulk'].popleft(), now)
+            return best, None
+        
+        if blocked:
+            wait = self.POLL_INTERVAL if wait is None else min(wait, self.POLL_INTERVAL)
+        return None, wait
+    
+    def start_item(self, item, now):
+        self.delays[item['priority']].append(now - item['queued'])
+        return item
+    
+    def send_loop(self, generation):
+        while True:
+            with self.cond:
+                if not self.running or generation != self.generation:
+                    return
+                username, wait = self.pick_next()
+                if username is None:
+                    self.cond.wait(wait)
+                    continue
+                state = self.clients[username]
+                item = state['current']
+            
+            # sockets are non-blocking and data goes out in chunks,
+            # so a client that isn't reading never holds up the others
+            end = min(len(item['data']), item['offset'] + self.CHUNK_SIZE)
+            try:
+                sent = state['socket'].send(item['data'][item['offset']:end])
+            except BlockingIOError:
+                # buffer full, item stays current until the socket drains
+                with self.cond:
+                    state['retry_at'] = time.monotonic() + self.POLL_INTERVAL
+                continue
+            except Exception as e:
+                self.log(f"Error sending to {username}: {str(e)}")
+                self.remove_client(username)
+                continue
+            
+            with self.cond:
+                item['offset'] += sent
+                state['bucket'].consume(sent)
+                self.global_bucket.consume(sent)
+                self.sent_bytes[item['priority']] += sent
+                if item['priority'] == self.BULK:
+                    state['vtime'] += sent / state['weight']
+                if item['offset'] >= len(item['data']):
+                    state['current'] = None
+    
+    def percentile(self, ordered, p):
+        # ordered delays in seconds, result in ms
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    
+    def get_stats(self):
+        with self.cond:
+            stats = {}
+            for priority, samples in self.delays.items():
+                ordered = sorted(samples)
+                stats[priority] = {
+                    "count": len(ordered),
+                    "avg_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+                    "p50_ms": self.percentile(ordered, 0.50),
+                    "p95_ms": self.percentile(ordered, 0.95),
+                    "p99_ms": self.percentile(ordered, 0.99),
+                    "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+                    "queued": sum(len(s[priority]) for s in self.clients.values()),
+                    "sent_bytes": self.sent_bytes[priority]
+                }
+            return stats
+
+class NotificationBus:
+    TOPICS = ("downloads",)
+    DEFAULT_WINDOW = 5
+    MAX_WINDOW = 60
+    MAX_BACKLOG = 100
+    TICK = 0.5
+    
+    def __init__(self, deliver, is_online, log, subscriptions_path):
+        self.deliver = deliver  # deliver(username, message)
+        self.is_online = is_online
+        self.log = log
+        self.subscriptions_path = subscriptions_path
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # username -> {topic: window}
+        self.pending = {}  # (owner, filename) -> coalesced downloads
+        self.backlog = {}  # offline username -> queued notifications
+        self.dropped = {}  # offline username -> notifications lost to the bound
+        self.running = False
+        self.generation = 0
+    
+    def load_subscriptions(self):
+        try:
+            if os.path.exists(self.subscriptions_path):
+                with open(self.subscriptions_path, 'r') as f:
+                    subscriptions = json.load(f)
+                # skip windows a hand edited file could have broken
+                self.subscriptions = {}
+                for username, topics in subscriptions.items():
+                    topics = {topic: window for topic, window in topics.items()
+                              if isinstance(window, (int, float)) and math.isfinite(window)}
+                    if topics:
+                        self.subscriptions[username] = topics
+        except Exception as e:
+            self.log(f"Error loading subscriptions: {str(e)}")
+            self.subscriptions = {}
+    
+    def save_subscriptions(self):
+        try:
+            with open(self.subscriptions_path, 'w') as f:
+                json.dump(self.subscriptions, f)
+        except Exception as e:
+            self.log(f"Error saving subscriptions: {str(e)}")
+    
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.generation += 1
+            generation = self.generation
+        threading.Thread(target=self.flush_loop, args=(generation,), daemon=True).start()
+    
+    def stop(self):
+        with self.lock:
+            self.running = False
+    
+    def subscribe(self, username, topic, window=DEFAULT_WINDOW):
+        if topic not in self.TOPICS:
+            raise Exception(f"Unknown topic '{topic}'")
+        window = float(window)
+        # nan would never compare as elapsed, so nothing would be sent
+        if not math.isfinite(window):
+            raise Exception("Window must be a finite number of seconds")
+        window = min(max(window, 0), self.MAX_WINDOW)
+        with self.lock:
+            self.subscriptions.setdefault(username, {})[topic] = window
+            self.save_subscriptions()
+        return window
+    
+    def unsubscribe(self, username, topic):
+        if topic not in self.TOPICS:
+            raise Exception(f"Unknown topic '{topic}'")
+        with self.lock:
+            topics = self.subscriptions.get(username, {})
+            topics.pop(topic, None)
+            if not topics:
+                self.subscriptions.pop(username, None)
+                self.backlog.pop(username, None)
+                self.dropped.pop(username, None)
+            self.save_subscriptions()
+    
+    def publish_download(self, owner, filename, downloader):
+        # cheap on the downloader's thread, delivery happens in flush_loop
+        with self.lock:
+            if "downloads" not in self.subscriptions.get(owner, {}):
+                return
+            entry = self.pending.get((owner, filename))
+            if entry is None:
+                entry = self.pending[(owner, filename)] = {
+                    "since": time.monotonic(),
+                    "count": 0,
+                    "downloaders": set()
+                }
+            entry['count'] += 1
+            entry['downloaders'].add(downloader)
+            entry['last'] = downloader
+    
+    def deliver_backlog(self, username):
+        # send everything queued while the user was offline in one batch,
+        # called once the reconnected client has subscribed again
+        with self.lock:
+            notifications = list(self.backlog.get(username, []))
+            dropped = self.dropped.get(username, 0)
+            if not (notifications or dropped):
+                return
+            # keep the backlog if the client is already gone again
+            if self.deliver(username, {
+                "type": "notification_batch",
+                "notifications": notifications,
+                "dropped": dropped
+            }):
+                self.backlog.pop(username, None)
+                self.dropped.pop(username, None)
+                self.log(f"Delivered {len(notifications)} queued notifications to {username}")
+    
+    def flush_loop(self, generation):
+        while True:
+            with self.lock:
+                if not self.running or generation != self.generation:
+                    return
+            self.flush()
+            time.sleep(self.TICK)
+    
+    def flush(self):
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for (owner, filename), entry in list(self.pending.items()):
+                window = self.subscriptions.get(owner, {}).get("downloads")
+                if window is None:
+                    # owner unsubscribed while downloads were pending
+                    del self.pending[(owner, filename)]
+                elif now - entry['since'] >= window:
+                    del self.pending[(owner, filename)]
+                    ready.append((owner, {
+                        "type": "download_notification",
+                        "filename": filename,
+                        "downloader": entry['last'],
+                        "count": entry['count'],
+                        "downloaders": sorted(entry['downloaders']),
+                        "window": window
+                    }))
+            
+            # same lock as deliver_backlog so nothing is queued behind
+            # a batch that was just sent
+            for owner, message in ready:
+                if owner not in self.backlog and self.is_online(owner) and self.deliver(owner, message):
+                    self.log(f"Notified '{owner}' about {message['count']} download(s) of '{message['filename']}'")
+                    continue
+                # offline, or still waiting to receive an earlier backlog
+                backlog = self.backlog.setdefault(owner, deque(maxlen=self.MAX_BACKLOG))
+                if len(backlog) == backlog.maxlen:
+                    self.dropped[owner] = self.dropped.get(owner, 0) + 1
+                backlog.append(message)
+
+class SearchIndex:
+    TOKEN_PATTERN = re.compile(rb"[a-z0-9]+")
+    SNIPPET_CHARS = 60
+    MAX_PAGE_SIZE = 50
+    # rewrite the log once it holds this many records per indexed file
+    COMPACT_RATIO = 2
+    COMPACT_MIN_RECORDS = 100
+    # bm25 ranking parameters
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, index_path, log):
+        # index_path is an append-only log, one json record per line
+        self.index_path = index_path
+        self.log = log
+        self.lock = threading.Lock()
+        self.terms = {}  # term -> {filename: [count, first byte offset]}
+        self.docs = {}  # filename -> path, length, mtime, size and terms
+        self.total_length = 0
+        self.records = 0  # lines in the log file
+        self.jobs = queue.Queue()
+        self.running = False
+    
+    def load(self):
+        # replay the log, later records replace earlier ones
+        corrupt = 0
+        try:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as f:
+                    for line in f:
+                        self.records += 1
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # partly written record from a crash
+                            corrupt += 1
+                            continue
+                        if record['op'] == 'update':
+                            self.add_doc(record['filename'], record['doc'], record['postings'])
+                        else:
+                            self.remove_doc(record['filename'])
+                self.log(f"Loaded search index ({len(self.docs)} files)")
+        except Exception as e:
+            self.log(f"Error loading search index: {str(e)}")
+            self.terms = {}
+            self.docs = {}
+            self.total_length = 0
+        
+        if corrupt:
+            self.log(f"Skipped {corrupt} damaged search index records")
+            self.compact()
+    
+    def append_record(self, record):
+        # cost depends only on the file that changed
+        try:
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+            self.records += 1
+        except Exception as e:
+            self.log(f"Error saving search index: {str(e)}")
+    
+    def compact(self):
+        # drop replaced and removed records, costs a full rewrite so only
+        # done once most of the log is stale
+        try:
+            with self.lock:
+                snapshot = [(filename, doc, {term: self.terms[term][filename] for term in doc['terms']})
+                            for filename, doc in self.docs.items()]
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                for filename, doc, postings in snapshot:
+                    f.write(json.dumps(self.update_record(filename, doc, postings)) + "\n")
+            os.replace(temp_path, self.index_path)
+            self.records = len(snapshot)
+        except Exception as e:
+            self.log(f"Error compacting search index: {str(e)}")
+    
+    def update_record(self, filename, doc, postings):
+        return {
+            "op": "update",
+            "filename": filename,
+            "doc": {key: doc[key] for key in ("path", "length", "mtime", "size")},
+            "postings": postings
+        }
+    
+    def start(self):
+        if not self.running:
+            self.running = True
+            threading.Thread(target=self.index_loop, daemon=True).start()
+    
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.jobs.put(None)
+    
+    def queue_update(self, filename, file_path):
+        self.jobs.put(("update", filename, file_path))
+    
+    def queue_remove(self, filename):
+        self.jobs.put(("remove", filename, None))
+    
+    def reconcile(self, files_info, storage_folder):
+        # catch up with files changed while the server was down
+        with self.lock:
+            docs = dict(self.docs)
+        for filename in files_info:
+            file_path = os.path.join(storage_folder, filename)
+            if not os.path.exists(file_path):
+                continue
+            stat = os.stat(file_path)
+            doc = docs.get(filename)
+            if (doc is None or doc['path'] != file_path
+                    or doc['mtime'] != stat.st_mtime or doc['size'] != stat.st_size):
+                self.queue_update(filename, file_path)
+        for filename in docs:
+            if filename not in files_info:
+                self.queue_remove(filename)
+    
+    def index_loop(self):
+        # only this thread writes the log
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            
+            self.process_job(job)
+    
+    def process_job(self, job):
+        action, filename, file_path = job
+        try:
+            if action == "update":
+                self.append_record(self.index_file(filename, file_path))
+            else:
+                with self.lock:
+                    removed = self.remove_doc(filename)
+                if removed:
+                    self.append_record({"op": "remove", "filename": filename})
+        except Exception as e:
+            self.log(f"Error indexing '{filename}': {str(e)}")
+        
+        if self.records > self.COMPACT_RATIO * len(self.docs) + self.COMPACT_MIN_RECORDS:
+            self.compact()
+    
+    def index_file(self, filename, file_path):
+        # tokenize outside the lock so searches aren't blocked
+        stat = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            data = f.read().lower()
+        
+        postings = {}
+        length = 0
+        for match in self.TOKEN_PATTERN.finditer(data):
+            length += 1
+            term = match.group().decode()
+            if term in postings:
+                postings[term][0] += 1
+            else:
+                postings[term] = [1, match.start()]
+        
+        doc = {
+            "path": file_path,
+            "length": length,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size
+        }
+        with self.lock:
+            self.add_doc(filename, doc, postings)
+        return self.update_record(filename, doc, postings)
+    
+    def add_doc(self, filename, doc, postings):
+        # caller holds the lock, or is loading before the worker starts
+        self.remove_doc(filename)
+        for term, posting in postings.items():
+            self.terms.setdefault(term, {})[filename] = posting
+        self.docs[filename] = dict(doc, terms=list(postings))
+        self.total_length += doc['length']
+    
+    def remove_doc(self, filename):
+        # caller holds the lock, returns whether anything was removed
+        doc = self.docs.pop(filename, None)
+        if doc is None:
+            return False
+        for term in doc['terms']:
+            postings = self.terms.get(term)
+            if postings is not None:
+                postings.pop(filename, None)
+                if not postings:
+                    del self.terms[term]
+        self.total_length -= doc['length']
+        return True
+    
+    def search(self, query, page=1, page_size=10):
+        # returns total matches and one page of (filename, score, snippet)
+        query = query.lower().encode('ascii', 'ignore')
+        terms = set(match.decode() for match in self.TOKEN_PATTERN.findall(query))
+        
+        with self.lock:
+            doc_count = len(self.docs)
+            if not terms or not doc_count:
+                return 0, []
+            average_length = self.total_length / doc_count or 1
+            
+            scores = {}
+            best_match = {}  # filename -> (idf, offset) of rarest matched term
+            for term in terms:
+                postings = self.terms.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for filename, (count, offset) in postings.items():
+                    length = self.docs[filename]['length']
+                    scores[filename] = scores.get(filename, 0) + idf * count * (self.K1 + 1) / (
+                        count + self.K1 * (1 - self.B + self.B * length / average_length))
+                    if filename not in best_match or idf > best_match[filename][0]:
+                        best_match[filename] = (idf, offset)
+            
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            start = (page - 1) * page_size
+            results = [(filename, score, self.docs[filename]['path'], best_match[filename][1])
+                       for filename, score in ranked[start:start + page_size]]
+        
+        # snippets read only the bytes around the match
+        return len(ranked), [(filename, score, self.read_snippet(path, offset))
+                             for filename, score, path, offset in results]
+    
+    def read_snippet(self, file_path, offset):
+        try:
+            start = max(0, offset - self.SNIPPET_CHARS)
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                text = f.read(self.SNIPPET_CHARS * 2).decode('utf-8', 'replace')
+            snippet = " ".join(text.split())
+            if start > 0:
+                snippet = "..." + snippet
+            if start + self.SNIPPET_CHARS * 2 < os.path.getsize(file_path):
+                snippet += "..."
+            return snippet
+        except Exception:
+            return ""
 
 class FileServer:
+    DOWNLOAD_CHUNK_CHARS = 4096
+    
     def __init__(self):
         # file info path
         self.files_info_path = "files_info.json"
+        self.subscriptions_path = "subscriptions.json"
+        self.search_index_path = "search_index.jsonl"
         
         # server state
         self.clients = {}  # active clients
@@ -16,6 +774,12 @@ class FileServer:
         self.server_socket = None
         self.running = False
         
+        # outgoing messages
+        self.scheduler = TransferScheduler(self.log)
+        self.notifications = NotificationBus(self.send_message, lambda username: username in self.clients,
+                                             self.log, self.subscriptions_path)
+        self.search_index = SearchIndex(self.search_index_path, self.log)
+        
         # gui setup
         self.window = tk.Tk()
         self.window.title("File Server")
@@ -23,6 +787,8 @@ class FileServer:
         
         # load file data
         self.load_files_info()
+        self.notifications.load_subscriptions()
+        self.search_index.load()
     
     def setup_gui(self):
         # port config
@@ -46,6 +812,35 @@ class FileServer:
         control_frame.pack(padx=5, pady=5, fill=tk.X)
         self.start_button = ttk.Button(control_frame, text="Start Server", command=self.start_server)
         self.start_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Scheduler Stats", command=self.show_scheduler_stats).pack(side=tk.LEFT, padx=5)
+        
+        # bandwidth limits
+        limit_frame = ttk.Frame(self.window)
+        limit_frame.pack(padx=5, pady=5, fill=tk.X)
+        ttk.Label(limit_frame, text="Global KB/s:").pack(side=tk.LEFT)
+        self.global_rate_entry = ttk.Entry(limit_frame, width=8)
+        self.global_rate_entry.pack(side=tk.LEFT, padx=5)
+        self.global_rate_entry.insert(0, "0")
+        ttk.Label(limit_frame, text="Per Client KB/s:").pack(side=tk.LEFT)
+        self.client_rate_entry = ttk.Entry(limit_frame, width=8)
+        self.client_rate_entry.pack(side=tk.LEFT, padx=5)
+        self.client_rate_entry.insert(0, "0")
+        ttk.Button(limit_frame, text="Apply Limits", command=self.apply_rate_limits).pack(side=tk.LEFT)
+        
+        # single client overrides
+        client_limit_frame = ttk.Frame(self.window)
+        client_limit_frame.pack(padx=5, pady=5, fill=tk.X)
+        ttk.Label(client_limit_frame, text="Client:").pack(side=tk.LEFT)
+        self.limit_client_entry = ttk.Entry(client_limit_frame, width=12)
+        self.limit_client_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(client_limit_frame, text="KB/s:").pack(side=tk.LEFT)
+        self.limit_rate_entry = ttk.Entry(client_limit_frame, width=8)
+        self.limit_rate_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(client_limit_frame, text="Weight:").pack(side=tk.LEFT)
+        self.limit_weight_entry = ttk.Entry(client_limit_frame, width=5)
+        self.limit_weight_entry.pack(side=tk.LEFT, padx=5)
+        self.limit_weight_entry.insert(0, "1")
+        ttk.Button(client_limit_frame, text="Apply to Client", command=self.apply_client_limits).pack(side=tk.LEFT)
         
         # log display
         log_frame = ttk.Frame(self.window)
@@ -58,6 +853,53 @@ class FileServer:
         if folder:
             self.folder_path.set(folder)
             self.log(f"Storage folder set to: {folder}")
+            if self.running:
+                self.search_index.reconcile(self.files_info, folder)
+    
+    def parse_rate(self, text):
+        # KB/s from the gui, inf and nan would break the token buckets
+        rate = float(text)
+        if not math.isfinite(rate) or rate < 0:
+            raise ValueError("limits must be numbers of 0 or more")
+        return rate
+    
+    def apply_rate_limits(self):
+        try:
+            # 0 means unlimited
+            global_rate = self.parse_rate(self.global_rate_entry.get())
+            client_rate = self.parse_rate(self.client_rate_entry.get())
+            self.scheduler.set_global_rate(int(global_rate * 1024))
+            self.scheduler.set_default_client_rate(int(client_rate * 1024))
+            self.log(f"Bandwidth limits set - global: {global_rate} KB/s, per client: {client_rate} KB/s")
+        except ValueError as e:
+            self.log(f"Invalid bandwidth limit: {str(e)}")
+    
+    def apply_client_limits(self):
+        try:
+            username = self.limit_client_entry.get().strip()
+            if username not in self.clients:
+                raise ValueError(f"no connected client named '{username}'")
+            
+            # empty rate goes back to the per client default
+            rate_text = self.limit_rate_entry.get().strip()
+            rate = self.parse_rate(rate_text) if rate_text else None
+            weight = float(self.limit_weight_entry.get() or 1)
+            if not math.isfinite(weight) or weight <= 0:
+                raise ValueError("weight must be a positive number")
+            
+            self.scheduler.set_client_rate(username, None if rate is None else int(rate * 1024))
+            self.scheduler.set_client_weight(username, weight)
+            rate_label = "default" if rate is None else f"{rate} KB/s"
+            self.log(f"Limits for {username} set - rate: {rate_label}, weight: {weight}")
+        except ValueError as e:
+            self.log(f"Invalid client limit: {str(e)}")
+    
+    def show_scheduler_stats(self):
+        for priority, stats in self.scheduler.get_stats().items():
+            self.log(f"{priority}: {stats['count']} msgs, queued {stats['queued']}, "
+                     f"delay avg {stats['avg_ms']:.1f}ms p50 {stats['p50_ms']:.1f}ms "
+                     f"p95 {stats['p95_ms']:.1f}ms p99 {stats['p99_ms']:.1f}ms "
+                     f"max {stats['max_ms']:.1f}ms, sent {stats['sent_bytes']} bytes")
     
     def start_server(self):
         if not self.running:
@@ -69,6 +911,11 @@ class FileServer:
                 self.running = True
                 self.start_button.config(text="Stop Server")
                 self.log(f"Server started on port {port}")
+                self.scheduler.start()
+                self.notifications.start()
+                self.search_index.start()
+                if self.folder_path.get():
+                    self.search_index.reconcile(self.files_info, self.folder_path.get())
                 
                 # accept connections
                 threading.Thread(target=self.accept_connections, daemon=True).start()
@@ -119,6 +966,9 @@ class FileServer:
                         pass
                 
                 self.clients.clear()
+                self.scheduler.stop()
+                self.notifications.stop()
+                self.search_index.stop()
                 self.start_button.config(text="Start Server")
                 self.log("Server stopped")
                 
@@ -143,10 +993,10 @@ class FileServer:
     
     def handle_client(self, client_socket, address):
         try:
-            data = client_socket.recv(1024).decode()
-            message = json.loads(data)
+            messages = self.receive_messages(client_socket)
+            message = next(messages, None)
             
-            if message['type'] == 'connect':
+            if message and message['type'] == 'connect':
                 requested_username = message['username']
                 
                 # check username
@@ -154,11 +1004,11 @@ class FileServer:
                     requested_username == name.split('(')[0] 
                     for name in self.clients.keys()
                 ):
-                    client_socket.send(json.dumps({
+                    client_socket.sendall(encode_message({
                         "type": "connect_response",
                         "status": "error",
                         "message": "Username is already taken. Please choose a unique name."
-                    }).encode())
+                    }))
                     self.log(f"Connection rejected - username '{requested_username}' is taken")
                     return
                 
@@ -168,34 +1018,55 @@ class FileServer:
                     "socket": client_socket,
                     "address": address
                 }
+                # only the scheduler writes from here on
+                client_socket.setblocking(False)
+                self.scheduler.add_client(username, client_socket)
                 
                 self.log(f"Client {username} connected from {address}")
                 
                 # send success response
-                client_socket.send(json.dumps({
+                self.send_message(username, {
                     "type": "connect_response",
                     "status": "success",
                     "assigned_username": username
-                }).encode())
+                })
                 
                 # handle client messages
-                while self.running:
-                    data = client_socket.recv(1024).decode()
-                    if not data:
-                        break
-                    self.handle_client_message(username, json.loads(data))
+                for message in messages:
+                    self.handle_client_message(username, message)
                     
         except Exception as e:
             self.log(f"Error handling client {address}: {str(e)}")
         finally:
             if 'username' in locals() and username in self.clients:
                 del self.clients[username]
+                self.scheduler.remove_client(username)
             try:
                 client_socket.close()
             except:
                 pass
             self.log(f"Client {address} disconnected")
     
+    def receive_messages(self, client_socket):
+        # yields messages until the client disconnects or the server stops
+        buffer = MessageBuffer()
+        selector = selectors.DefaultSelector()
+        selector.register(client_socket, selectors.EVENT_READ)
+        try:
+            while self.running:
+                if not selector.select(1):
+                    continue
+                try:
+                    data = client_socket.recv(64 * 1024)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    return
+                for message in buffer.feed(data):
+                    yield message
+        finally:
+            selector.close()
+    
     def generate_unique_username(self, base_username):
         if base_username not in self.clients:
             return base_username
@@ -206,6 +1077,11 @@ class FileServer:
         
         return f"{base_username}({counter})"
     
+    def send_message(self, username, message, bulk=False):
+        # queue message for the scheduler, file contents go as bulk data
+        priority = TransferScheduler.BULK if bulk else TransferScheduler.CONTROL
+        return self.scheduler.enqueue(username, message, priority)
+    
     def handle_client_message(self, username, message):
         try:
             if message['type'] == 'list_files':
@@ -216,6 +1092,14 @@ class FileServer:
                 self.handle_file_download(username, message)
             elif message['type'] == 'delete_file':
                 self.handle_file_delete(username, message)
+            elif message['type'] == 'delta_signature_request':
+                self.send_delta_signature(username, message)
+            elif message['type'] == 'upload_delta':
+                self.handle_delta_upload(username, message)
+            elif message['type'] == 'search':
+                self.handle_search(username, message)
+            elif message['type'] in ('subscribe', 'unsubscribe'):
+                self.handle_subscription(username, message)
         except Exception as e:
             self.log(f"Error handling message from {username}: {str(e)}")
     
@@ -252,14 +1136,15 @@ class FileServer:
             # update files info
             self.files_info[full_filename] = username
             self.save_files_info()
+            self.search_index.queue_update(full_filename, file_path)
             
             # send success response
-            self.clients[username]['socket'].send(json.dumps({
+            self.send_message(username, {
                 "type": "upload_response",
                 "status": "success",
                 "filename": filename,
                 "overwritten": is_overwriting
-            }).encode())
+            })
             
             # log message
             if is_overwriting:
@@ -273,11 +1158,104 @@ class FileServer:
         except Exception as e:
             self.log(f"Error handling file upload from {username}: {str(e)}")
             # send error response
-            self.clients[username]['socket'].send(json.dumps({
+            self.send_message(username, {
                 "type": "upload_response",
                 "status": "error",
                 "message": str(e)
-            }).encode())
+            })
+    
+    def get_owned_file_path(self, username, filename):
+        # delta sync only works on the user's own existing files
+        full_filename = f"{username}_{filename}"
+        if self.files_info.get(full_filename) != username:
+            raise Exception("File not found or permission denied")
+        
+        storage_folder = self.folder_path.get()
+        if not storage_folder:
+            raise Exception("Storage folder not set")
+        return os.path.join(storage_folder, full_filename)
+    
+    def send_delta_signature(self, username, message):
+        try:
+            filename = message['filename']
+            file_path = self.get_owned_file_path(username, filename)
+            
+            with open(file_path, 'r') as f:
+                content = f.read()
+            
+            block_size = delta_block_size(len(content))
+            self.send_message(username, {
+                "type": "delta_signature",
+                "status": "success",
+                "filename": filename,
+                "block_size": block_size,
+                "checksum": hashlib.md5(content.encode()).hexdigest(),
+                "signatures": block_signatures(content, block_size)
+            })
+            
+        except Exception as e:
+            self.log(f"Error sending delta signature to {username}: {str(e)}")
+            # client falls back to a full upload
+            self.send_message(username, {
+                "type": "delta_signature",
+                "status": "error",
+                "filename": message.get('filename'),
+                "message": str(e)
+            })
+    
+    def handle_delta_upload(self, username, message):
+        try:
+            filename = message['filename']
+            file_path = self.get_owned_file_path(username, filename)
+            
+            with open(file_path, 'r') as f:
+                base = f.read()
+            
+            # file must not have changed since the signature was sent
+            if hashlib.md5(base.encode()).hexdigest() != message['base_checksum']:
+                raise Exception("File changed on server since delta was computed")
+            
+            # block size comes from the file, same as in the signature
+            block_size = delta_block_size(len(base))
+            if message['block_size'] != block_size:
+                raise Exception("Delta block size doesn't match the signature")
+            
+            content = apply_delta(base, block_size, message['ops'])
+            if hashlib.md5(content.encode()).hexdigest() != message['checksum']:
+                raise Exception("Reconstructed file checksum mismatch")
+            
+            # replace the old copy in one step
+            temp_path = file_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                f.write(content)
+            os.replace(temp_path, file_path)
+            self.search_index.queue_update(f"{username}_{filename}", file_path)
+            
+            literal_size = sum(len(op) for op in message['ops'] if isinstance(op, str))
+            self.send_message(username, {
+                "type": "upload_response",
+                "status": "success",
+                "filename": filename,
+                "overwritten": True,
+                "delta": True
+            })
+            
+            self.log(f"File '{filename}' overwritten by {username} using delta "
+                     f"({literal_size} of {len(content)} chars sent)")
+            
+            # update clients
+            self.broadcast_file_list()
+            
+        except Exception as e:
+            self.log(f"Error handling delta upload from {username}: {str(e)}")
+            # ask client to send the whole file instead
+            self.send_message(username, {
+                "type": "upload_response",
+                "status": "error",
+                "filename": message.get('filename'),
+                "message": str(e),
+                "resend": True
+            })
     
     def handle_file_download(self, username, message):
         try:
@@ -295,34 +1273,40 @@ class FileServer:
             with open(file_path, 'r') as f:
                 content = f.read()
             
-            # send file content
-            self.clients[username]['socket'].send(json.dumps({
-                "type": "download_response",
-                "status": "success",
+            # send file content in pieces, control messages can go
+            # out between them
+            self.send_message(username, {
+                "type": "download_start",
                 "filename": filename,
-                "content": content
-            }).encode())
+                "size": len(content)
+            }, bulk=True)
+            for offset in range(0, len(content), self.DOWNLOAD_CHUNK_CHARS):
+                self.send_message(username, {
+                    "type": "download_chunk",
+                    "filename": filename,
+                    "offset": offset,
+                    "data": content[offset:offset + self.DOWNLOAD_CHUNK_CHARS]
+                }, bulk=True)
+            self.send_message(username, {
+                "type": "download_end",
+                "filename": filename
+            }, bulk=True)
             
-            self.log(f"File '{filename}' sent to {username}")
+            self.log(f"File '{filename}' queued for {username}")
             
-            # notify uploader
+            # notify uploader, coalesced by the notification bus
             uploader = self.files_info[filename]
-            if uploader in self.clients and uploader != username:
-                self.clients[uploader]['socket'].send(json.dumps({
-                    "type": "download_notification",
-                    "filename": filename,
-                    "downloader": username
-                }).encode())
-                self.log(f"Uploader '{uploader}' notified about download by '{username}'")
+            if uploader != username:
+                self.notifications.publish_download(uploader, filename, username)
             
         except Exception as e:
             self.log(f"Error handling file download for {username}: {str(e)}")
             # send error response
-            self.clients[username]['socket'].send(json.dumps({
+            self.send_message(username, {
                 "type": "download_response",
                 "status": "error",
                 "message": str(e)
-            }).encode())
+            })
     
     def handle_file_delete(self, username, message):
         try:
@@ -342,13 +1326,14 @@ class FileServer:
             # remove from files info
             del self.files_info[filename]
             self.save_files_info()
+            self.search_index.queue_remove(filename)
             
             # send success response
-            self.clients[username]['socket'].send(json.dumps({
+            self.send_message(username, {
                 "type": "delete_response",
                 "status": "success",
                 "filename": filename
-            }).encode())
+            })
             
             self.log(f"File '{filename}' deleted by {username}")
             
@@ -358,29 +1343,90 @@ class FileServer:
         except Exception as e:
             self.log(f"Error handling file delete for {username}: {str(e)}")
             # send error response
-            self.clients[username]['socket'].send(json.dumps({
+            self.send_message(username, {
                 "type": "delete_response",
                 "status": "error",
                 "message": str(e)
-            }).encode())
+            })
+    
+    def handle_search(self, username, message):
+        try:
+            query = message['query']
+            page = max(1, int(message.get('page', 1)))
+            page_size = min(max(1, int(message.get('page_size', 10))), SearchIndex.MAX_PAGE_SIZE)
+            total, results = self.search_index.search(query, page, page_size)
+            
+            self.send_message(username, {
+                "type": "search_response",
+                "status": "success",
+                "query": query,
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "results": [{
+                    "filename": filename,
+                    "owner": self.files_info.get(filename),
+                    "score": round(score, 3),
+                    "snippet": snippet
+                } for filename, score, snippet in results]
+            })
+            
+        except Exception as e:
+            self.log(f"Error handling search from {username}: {str(e)}")
+            self.send_message(username, {
+                "type": "search_response",
+                "status": "error",
+                "message": str(e)
+            })
+    
+    def handle_subscription(self, username, message):
+        try:
+            topic = message.get('topic', 'downloads')
+            if message['type'] == 'subscribe':
+                window = self.notifications.subscribe(
+                    username, topic, message.get('window', NotificationBus.DEFAULT_WINDOW))
+                self.log(f"{username} subscribed to {topic} notifications ({window}s window)")
+            else:
+                window = None
+                self.notifications.unsubscribe(username, topic)
+                self.log(f"{username} unsubscribed from {topic} notifications")
+            
+            self.send_message(username, {
+                "type": "subscribe_response",
+                "status": "success",
+                "topic": topic,
+                "subscribed": message['type'] == 'subscribe',
+                "window": window
+            })
+            
+            # anything missed while offline follows the response
+            if message['type'] == 'subscribe':
+                self.notifications.deliver_backlog(username)
+            
+        except Exception as e:
+            self.log(f"Error handling subscription for {username}: {str(e)}")
+            self.send_message(username, {
+                "type": "subscribe_response",
+                "status": "error",
+                "message": str(e)
+            })
     
     def broadcast_file_list(self):
-        for client in self.clients.values():
+        for username in list(self.clients.keys()):
             try:
-                client['socket'].send(json.dumps({
+                self.send_message(username, {
                     "type": "file_list",
                     "files": self.files_info
-                }).encode())
+                })
             except Exception as e:
                 self.log(f"Error broadcasting file list: {str(e)}")
     
     def send_file_list(self, username):
         try:
-            client_socket = self.clients[username]['socket']
-            client_socket.send(json.dumps({
+            self.send_message(username, {
                 "type": "file_list",
                 "files": self.files_info
-            }).encode())
+            })
         except Exception as e:
             self.log(f"Error sending file list to {username}: {str(e)}")
 
@@ -0,0 +1,87 @@
+import importlib.util
+import os
+import random
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, path):
+    # Server/ and Client/ are run as scripts, not packages
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+server = load_module("server", "Server/server.py")
+client = load_module("client", "Client/client.py")
+
+
+def round_trip(base, new):
+    block_size = server.delta_block_size(len(base))
+    signatures = server.block_signatures(base, block_size)
+    ops = client.compute_delta(new, block_size, signatures)
+    return server.apply_delta(base, block_size, ops), ops
+
+
+def literal_size(ops):
+    return sum(len(op) for op in ops if isinstance(op, str))
+
+
+class DeltaSyncTest(unittest.TestCase):
+    def test_checksums_match_between_client_and_server(self):
+        block = "some text\nwith lines and ünïcode\n" * 40
+        self.assertEqual(server.weak_checksum(block), client.weak_checksum(block))
+        self.assertEqual(server.strong_checksum(block), client.strong_checksum(block))
+
+    def test_random_edits_round_trip(self):
+        rng = random.Random(0)
+        alphabet = "abcdefgh \n"
+        for _ in range(100):
+            base = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 5000)))
+            new = base
+            for _ in range(rng.randint(0, 5)):
+                start = rng.randint(0, len(new))
+                end = rng.randint(start, min(len(new), start + 200))
+                insert = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200)))
+                new = new[:start] + insert + new[end:]
+            rebuilt, _ = round_trip(base, new)
+            self.assertEqual(rebuilt, new)
+
+    def test_append_only_sends_tail(self):
+        base = "".join(f"{i} log entry\n" for i in range(20000))
+        new = base + "appended line\n" * 10
+        rebuilt, ops = round_trip(base, new)
+        self.assertEqual(rebuilt, new)
+        block_size = server.delta_block_size(len(base))
+        # new lines plus at most the unmatched partial last block
+        self.assertLessEqual(literal_size(ops), len(new) - len(base) + block_size)
+
+    def test_shifted_content_still_matches_blocks(self):
+        base = "".join(f"line {i}\n" for i in range(5000))
+        new = "inserted at the start\n" + base
+        rebuilt, ops = round_trip(base, new)
+        self.assertEqual(rebuilt, new)
+        self.assertLess(literal_size(ops), len(new) // 10)
+
+    def test_stops_when_literal_budget_is_exceeded(self):
+        rng = random.Random(1)
+        base = "".join(rng.choice("abcdefgh \n") for _ in range(200000))
+        rewritten = "".join(rng.choice("abcdefgh \n") for _ in range(200000))
+        block_size = server.delta_block_size(len(base))
+        signatures = server.block_signatures(base, block_size)
+        self.assertIsNone(client.compute_delta(rewritten, block_size, signatures, len(rewritten) // 2))
+
+        # a small edit stays within budget and still round trips
+        edited = base[:1000] + "edit" + base[1000:]
+        ops = client.compute_delta(edited, block_size, signatures, len(edited) // 2)
+        self.assertEqual(server.apply_delta(base, block_size, ops), edited)
+
+    def test_apply_delta_rejects_bad_block_reference(self):
+        with self.assertRaises(Exception):
+            server.apply_delta("x" * 1400, 700, [[1, 2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, path):
+    # Server/ and Client/ are run as scripts, not packages
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+server = load_module("server", "Server/server.py")
+
+
+class NotificationBusTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "subscriptions.json")
+        self.delivered = []
+        self.online = set()
+        self.accept = True  # what deliver reports back to the bus
+        self.bus = server.NotificationBus(self.deliver, lambda username: username in self.online,
+                                          lambda message: None, self.path)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def deliver(self, username, message):
+        if self.accept:
+            self.delivered.append((username, message))
+        return self.accept
+
+    def test_downloads_are_coalesced_per_file(self):
+        self.online.add("alice")
+        self.bus.subscribe("alice", "downloads", 0)
+        for downloader in ["bob", "carol", "bob", "dave", "bob"]:
+            self.bus.publish_download("alice", "alice_x.txt", downloader)
+        self.bus.publish_download("alice", "alice_y.txt", "bob")
+        self.bus.flush()
+
+        by_file = {message['filename']: message for _, message in self.delivered}
+        self.assertEqual(len(self.delivered), 2)
+        self.assertEqual(by_file["alice_x.txt"]['count'], 5)
+        self.assertEqual(by_file["alice_x.txt"]['downloaders'], ["bob", "carol", "dave"])
+        self.assertEqual(by_file["alice_y.txt"]['count'], 1)
+
+    def test_waits_for_window(self):
+        self.online.add("alice")
+        self.bus.subscribe("alice", "downloads", 60)
+        self.bus.publish_download("alice", "alice_x.txt", "bob")
+        self.bus.flush()
+        self.assertEqual(self.delivered, [])
+
+    def test_unsubscribed_owner_gets_nothing(self):
+        self.online.add("alice")
+        self.bus.publish_download("alice", "alice_x.txt", "bob")
+        self.bus.flush()
+        self.assertEqual(self.delivered, [])
+
+    def test_offline_backlog_is_bounded(self):
+        self.bus.MAX_BACKLOG = 3
+        self.bus.subscribe("alice", "downloads", 0)
+        for i in range(5):
+            self.bus.publish_download("alice", f"alice_{i}.txt", "bob")
+        self.bus.flush()
+        self.assertEqual(self.delivered, [])
+
+        self.online.add("alice")
+        self.bus.deliver_backlog("alice")
+        (username, batch), = self.delivered
+        self.assertEqual(batch['type'], "notification_batch")
+        self.assertEqual(len(batch['notifications']), 3)
+        self.assertEqual(batch['dropped'], 2)
+        self.assertNotIn("alice", self.bus.backlog)
+        self.assertNotIn("alice", self.bus.dropped)
+
+    def test_backlog_kept_when_delivery_fails(self):
+        self.bus.subscribe("alice", "downloads", 0)
+        self.bus.publish_download("alice", "alice_x.txt", "bob")
+        self.bus.flush()
+
+        self.accept = False
+        self.bus.deliver_backlog("alice")
+        self.assertEqual(len(self.bus.backlog["alice"]), 1)
+
+        self.accept = True
+        self.bus.deliver_backlog("alice")
+        self.assertEqual(len(self.delivered), 1)
+        self.assertNotIn("alice", self.bus.backlog)
+
+    def test_new_notifications_wait_behind_backlog(self):
+        self.bus.subscribe("alice", "downloads", 0)
+        self.bus.publish_download("alice", "alice_x.txt", "bob")
+        self.bus.flush()
+        # online again but hasn't subscribed yet
+        self.online.add("alice")
+        self.bus.publish_download("alice", "alice_x.txt", "carol")
+        self.bus.flush()
+        self.assertEqual(self.delivered, [])
+        self.assertEqual(len(self.bus.backlog["alice"]), 2)
+
+    def test_rejects_non_finite_window(self):
+        for window in ["nan", float("nan"), float("inf"), "-inf"]:
+            with self.assertRaises(Exception):
+                self.bus.subscribe("alice", "downloads", window)
+        self.assertNotIn("alice", self.bus.subscriptions)
+
+    def test_window_is_clamped(self):
+        self.assertEqual(self.bus.subscribe("alice", "downloads", 1000), self.bus.MAX_WINDOW)
+        self.assertEqual(self.bus.subscribe("alice", "downloads", -5), 0)
+
+    def test_subscriptions_persist_and_skip_bad_windows(self):
+        self.bus.subscribe("alice", "downloads", 3)
+        with open(self.path) as f:
+            data = json.load(f)
+        data["mallory"] = {"downloads": float("nan")}
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+        bus = server.NotificationBus(None, None, lambda message: None, self.path)
+        bus.load_subscriptions()
+        self.assertEqual(bus.subscriptions, {"alice": {"downloads": 3}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import importlib.util
+import os
+import socket
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, path):
+    # Server/ and Client/ are run as scripts, not packages
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+server = load_module("server", "Server/server.py")
+
+
+class Peer:
+    # the client end of a socketpair, optionally reading in the background
+    def __init__(self, read=True):
+        self.server_socket, self.socket = socket.socketpair()
+        self.server_socket.setblocking(False)
+        self.buffer = server.MessageBuffer()
+        self.messages = []  # (arrival time, message)
+        self.bytes = 0
+        self.closed = False
+        if read:
+            threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def read_loop(self):
+        try:
+            while not self.closed:
+                data = self.socket.recv(64 * 1024)
+                if not data:
+                    return
+                self.bytes += len(data)
+                now = time.monotonic()
+                self.messages.extend((now, m) for m in self.buffer.feed(data))
+        except OSError:
+            pass
+
+    def wait_for(self, message_type, timeout=5):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            for arrived, message in self.messages:
+                if message.get('type') == message_type:
+                    return arrived
+            time.sleep(0.005)
+        raise AssertionError(f"no {message_type} message within {timeout}s")
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+        self.server_socket.close()
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_unlimited_never_waits(self):
+        bucket = server.TokenBucket(0)
+        bucket.consume(10 ** 9)
+        self.assertEqual(bucket.delay(time.monotonic()), 0)
+
+    def test_burst_then_debt_is_paid_at_rate(self):
+        bucket = server.TokenBucket(100 * 1024)
+        self.assertEqual(bucket.tokens, bucket.burst)
+        bucket.consume(bucket.burst + 50 * 1024)
+        # half a second of debt, measured without letting time pass
+        self.assertAlmostEqual(bucket.delay(bucket.last), 0.5, places=3)
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = server.TokenBucket(100 * 1024)
+        bucket.consume(1000)
+        bucket.refill(bucket.last + 3600)
+        self.assertEqual(bucket.tokens, bucket.burst)
+
+    def test_lowering_rate_clamps_tokens(self):
+        bucket = server.TokenBucket(1024 * 1024)
+        bucket.set_rate(100 * 1024)
+        self.assertLessEqual(bucket.tokens, bucket.burst)
+
+
+class TransferSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = server.TransferScheduler(lambda message: None)
+        self.peers = {}
+
+    def tearDown(self):
+        self.scheduler.stop()
+        for peer in self.peers.values():
+            peer.close()
+
+    def add_peer(self, username, read=True):
+        peer = self.peers[username] = Peer(read)
+        self.scheduler.add_client(username, peer.server_socket)
+        return peer
+
+    def test_new_client_starts_at_current_fair_share(self):
+        self.add_peer("a", read=False)
+        self.add_peer("b", read=False)
+        self.scheduler.enqueue("a", {"data": "x"}, server.TransferScheduler.BULK)
+        self.scheduler.clients["a"]['vtime'] = 1000.0
+        self.scheduler.enqueue("b", {"data": "x"}, server.TransferScheduler.BULK)
+        self.assertEqual(self.scheduler.clients["b"]['vtime'], 1000.0)
+
+    def test_per_client_rate_limit(self):
+        peer = self.add_peer("a")
+        self.scheduler.set_default_client_rate(200 * 1024)
+        self.scheduler.start()
+        start = time.monotonic()
+        self.scheduler.enqueue("a", {"type": "bulk", "data": "x" * 200 * 1024},
+                               server.TransferScheduler.BULK)
+        elapsed = peer.wait_for("bulk") - start
+        # 64 KB burst, the rest at 200 KB/s is about 0.68s
+        self.assertGreater(elapsed, 0.5)
+        self.assertLess(elapsed, 1.5)
+
+    def test_weights_split_bandwidth(self):
+        heavy = self.add_peer("heavy")
+        light = self.add_peer("light")
+        self.scheduler.set_global_rate(300 * 1024)
+        self.scheduler.set_client_weight("heavy", 3.0)
+        for username in ("heavy", "light"):
+            self.scheduler.enqueue(username, {"data": "x" * 2000000}, server.TransferScheduler.BULK)
+        self.scheduler.start()
+        time.sleep(1.5)
+        ratio = heavy.bytes / max(1, light.bytes)
+        self.assertGreater(ratio, 2.3)
+        self.assertLess(ratio, 3.8)
+
+    def test_control_not_delayed_by_other_clients_bulk(self):
+        self.add_peer("bulk")
+        interactive = self.add_peer("interactive")
+        self.scheduler.set_global_rate(50 * 1024)
+        for _ in range(100):
+            self.scheduler.enqueue("bulk", {"data": "x" * 4096}, server.TransferScheduler.BULK)
+        self.scheduler.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.scheduler.enqueue("interactive", {"type": "file_list"})
+        self.assertLess(interactive.wait_for("file_list") - start, 0.2)
+
+    def test_control_goes_between_own_bulk_chunks(self):
+        peer = self.add_peer("a")
+        self.scheduler.set_default_client_rate(50 * 1024)
+        for offset in range(50):
+            self.scheduler.enqueue("a", {"type": "download_chunk", "offset": offset, "data": "x" * 4096},
+                                   server.TransferScheduler.BULK)
+        self.scheduler.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        self.scheduler.enqueue("a", {"type": "file_list"})
+        self.assertLess(peer.wait_for("file_list") - start, 0.5)
+        # most of the download was still queued behind it
+        chunks_before = [m for _, m in peer.messages if m.get('type') == 'download_chunk']
+        self.assertLess(len(chunks_before), 40)
+        self.assertGreater(self.scheduler.get_stats()['control']['count'], 0)
+
+    def test_full_buffer_does_not_block_other_clients(self):
+        self.add_peer("stalled", read=False)
+        other = self.add_peer("other")
+        self.scheduler.start()
+        self.scheduler.enqueue("stalled", {"type": "file_list", "files": "x" * 5000000})
+        time.sleep(0.3)
+        start = time.monotonic()
+        self.scheduler.enqueue("other", {"type": "file_list"})
+        self.assertLess(other.wait_for("file_list") - start, 0.2)
+        # the stalled message is kept, not dropped
+        with self.scheduler.cond:
+            current = self.scheduler.clients["stalled"]['current']
+        self.assertIsNotNone(current)
+        self.assertLess(current['offset'], len(current['data']))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import copy
+import importlib.util
+import os
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, path):
+    # Server/ and Client/ are run as scripts, not packages
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+server = load_module("server", "Server/server.py")
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.folder.name, "search_index.jsonl")
+        self.index = self.new_index()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def new_index(self):
+        return server.SearchIndex(self.index_path, lambda message: None)
+
+    def write(self, filename, content):
+        # jobs run in order on this thread instead of the worker
+        file_path = os.path.join(self.folder.name, filename)
+        with open(file_path, 'w') as f:
+            f.write(content)
+        self.index.process_job(("update", filename, file_path))
+
+    def remove(self, filename):
+        self.index.process_job(("remove", filename, None))
+
+    def state(self, index):
+        return copy.deepcopy((index.terms, index.docs, index.total_length))
+
+    def test_replay_matches_index_after_damaged_record(self):
+        self.write("u_a.txt", "apple banana cherry")
+        self.write("u_b.txt", "banana split")
+        self.write("u_c.txt", "cherry pie")
+        self.write("u_a.txt", "apple apple durian")  # overwrite
+        self.remove("u_c.txt")
+        expected = self.state(self.index)
+        self.assertNotIn("u_c.txt", self.index.docs)
+        self.assertNotIn("pie", self.index.terms)
+
+        # crash while appending the next record
+        self.write("u_d.txt", "elderberry fig grape")
+        with open(self.index_path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.index_path) - 20)
+
+        reloaded = self.new_index()
+        reloaded.load()
+        self.assertEqual(self.state(reloaded), expected)
+
+        # the damaged log was rewritten with one record per file
+        with open(self.index_path) as f:
+            self.assertEqual(len(f.readlines()), len(expected[1]))
+        again = self.new_index()
+        again.load()
+        self.assertEqual(self.state(again), expected)
+
+    def test_compacts_once_log_is_mostly_stale(self):
+        self.index.COMPACT_RATIO = 2
+        self.index.COMPACT_MIN_RECORDS = 0
+        self.write("u_a.txt", "one")
+        self.write("u_a.txt", "two")
+        self.assertEqual(self.index.records, 2)
+        self.write("u_a.txt", "three")
+        self.assertEqual(self.index.records, 1)
+
+        reloaded = self.new_index()
+        reloaded.load()
+        self.assertEqual(self.state(reloaded), self.state(self.index))
+        self.assertEqual(reloaded.search("three")[0], 1)
+        self.assertEqual(reloaded.search("one")[0], 0)
+
+    def test_ranks_by_term_frequency_and_rarity(self):
+        self.write("u_a.txt", "needle " + "hay " * 50)
+        self.write("u_b.txt", "needle needle needle " + "hay " * 48)
+        self.write("u_c.txt", "hay " * 50)
+        total, results = self.index.search("needle", 1, 10)
+        self.assertEqual(total, 2)
+        self.assertEqual([filename for filename, _, _ in results], ["u_b.txt", "u_a.txt"])
+
+        # the rare term outweighs the common one
+        self.write("u_d.txt", "hay hay hay hay rare")
+        _, results = self.index.search("hay rare", 1, 10)
+        self.assertEqual(results[0][0], "u_d.txt")
+
+    def test_pagination(self):
+        for i in range(25):
+            self.write(f"u_{i:02d}.txt", "common " * (i + 1) + "filler " * 30)
+        pages = [self.index.search("common", page, 10) for page in (1, 2, 3, 4)]
+        self.assertEqual([total for total, _ in pages], [25] * 4)
+        self.assertEqual([len(results) for _, results in pages], [10, 10, 5, 0])
+        names = [filename for _, results in pages for filename, _, _ in results]
+        self.assertEqual(len(set(names)), 25)
+        scores = [score for _, results in pages for _, score, _ in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_snippet_reads_around_match_offset(self):
+        self.write("u_a.txt", "padding " * 5000 + "the Needle is here " + "tail " * 100)
+        _, [(_, _, snippet)] = self.index.search("needle")
+        self.assertIn("the Needle is here", snippet)
+        self.assertTrue(snippet.startswith("..."))
+        self.assertTrue(snippet.endswith("..."))
+
+    def test_reconcile_queues_changed_and_removed_files(self):
+        self.write("u_a.txt", "same")
+        self.write("u_b.txt", "old")
+        self.write("u_gone.txt", "gone")
+        with open(os.path.join(self.folder.name, "u_b.txt"), 'a') as f:
+            f.write(" and changed")
+        self.index.reconcile({"u_a.txt": "u", "u_b.txt": "u"}, self.folder.name)
+        jobs = []
+        while not self.index.jobs.empty():
+            jobs.append(self.index.jobs.get()[:2])
+        self.assertEqual(sorted(jobs), [("remove", "u_gone.txt"), ("update", "u_b.txt")])
+
+
+if __name__ == "__main__":
+    unittest.main()